@@ -5,6 +5,7 @@ import drjit as dr
 import numpy as np
 import matplotlib.pyplot as plt
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 
 scene = mi.load_file(os.path.abspath('cornell-box/cbox_diffuse.xml'))
@@ -24,22 +25,37 @@ opt['trans'] = mi.Point2f(50.0, 0.0)
 apply_transformation(params, opt)
 _, trans = mi.render(scene, params=params, spp=16)
 
+# Mean squared error scale, precomputed so that the loss is a single
+# squared-difference reduction over the transient tensor
+loss_scale = 100.0 / dr.prod(data_transient_ref.shape)
+
+def write_image(image_host, path):
+    mi.util.convert_to_bitmap(image_host).write(path)
+
+# PNG encoding runs on a worker thread (at most one write in flight)
+# so that it overlaps with the next iterations' rendering
+pending_write = None
+
 loss_hist = []
-for it in range(10000):
-    apply_transformation(params, opt)
-    image, trans = mi.render(scene, params=params, spp=16)
-
-    loss = dr.mean(dr.square(trans - data_transient_ref)) * 100
-
-    dr.backward(loss)
-
-    opt.step()
-    params.update(opt)
-    # import pdb; pdb.set_trace()
-    loss_hist.append(loss)
-    
-    #save image
-    if it % 100 == 0:
-        mi.util.convert_to_bitmap(image).write(f"debug_output/transient_{it:03d}.png")
-    print(f"Iteration {it:02d}: error={loss}, {opt['trans'].x}, {opt['trans'].y}", end='\r')
-    
\ No newline at end of file
+with ThreadPoolExecutor(max_workers=1) as writer:
+    for it in range(10000):
+        apply_transformation(params, opt)
+        image, trans = mi.render(scene, params=params, spp=16)
+
+        loss = dr.sum(dr.square(trans - data_transient_ref), axis=None) * loss_scale
+
+        dr.backward(loss)
+
+        opt.step()
+        params.update(opt)
+        # import pdb; pdb.set_trace()
+        loss_hist.append(loss)
+
+        #save image
+        if it % 100 == 0:
+            if pending_write is not None:
+                pending_write.result()
+            image_host = image.numpy()
+            pending_write = writer.submit(
+                write_image, image_host, f"debug_output/transient_{it:03d}.png")
+        print(f"Iteration {it:02d}: error={loss}, {opt['trans'].x}, {opt['trans'].y}", end='\r')
@@ -57,9 +57,18 @@ class TransientHDRFilm(mi.Film):
 
     def __init__(self, props: mi.Properties):
         super().__init__(props)
-        self.temporal_bins = props.get("temporal_bins", mi.UInt32(2048))
-        self.bin_width_opl = props.get("bin_width_opl", mi.Float(0.003))
-        self.start_opl = props.get("start_opl", mi.UInt32(0))
+        self.temporal_bins = props.get("temporal_bins", 2048)
+        self.bin_width_opl = props.get("bin_width_opl", 0.003)
+        self.start_opl = props.get("start_opl", 0.0)
+        self.update_bin_constants_()
+        self.prepare_key_ = None
+        self.prepare_rfilter_ = None
+
+    def update_bin_constants_(self):
+        # Kept as Python floats so that they are embedded as literals in the
+        # kernel, turning the bin computation into a single fma
+        self.inv_bin_width_opl = 1.0 / self.bin_width_opl
+        self.neg_start_over_bin_width = -self.start_opl / self.bin_width_opl
 
     def end_opl(self):
         return self.start_opl + self.bin_width_opl * self.temporal_bins
@@ -68,6 +77,20 @@ class TransientHDRFilm(mi.Film):
         return self.steady.base_channels_count()
 
     def prepare(self, aovs: Sequence[str]):
+        # Re-creating the steady film and the transient storage is expensive
+        # when rendering repeatedly (e.g. optimization loops), so they are
+        # reused (and cleared) while the film geometry and AOVs do not change
+        # (the reconstruction filter is compared by identity: a reference is
+        # kept so that its Python wrapper, and hence its identity, is stable)
+        prepare_key = (
+            tuple(self.size()), tuple(self.crop_offset()), tuple(self.crop_size()),
+            self.sample_border(), self.temporal_bins, tuple(aovs)
+        )
+        rfilter = self.rfilter()
+        if prepare_key == self.prepare_key_ and rfilter is self.prepare_rfilter_:
+            self.clear()
+            return len(self.channels)
+
         # Prepare steady film
         steady_hdrfilm_dict = {
             'type': 'hdrfilm',
@@ -79,13 +102,15 @@ class TransientHDRFilm(mi.Film):
             'crop_width': self.crop_size().x,
             'crop_height': self.crop_size().y,
             'sample_border': self.sample_border(),
-            'rfilter': self.rfilter()
+            'rfilter': rfilter
         }
         self.steady: mi.Film = mi.load_dict(steady_hdrfilm_dict)
         self.steady.prepare(aovs)
 
         # Prepare transient image block
         channels = self.prepare_transient_(aovs)
+        self.prepare_key_ = prepare_key
+        self.prepare_rfilter_ = rfilter
         return channels
 
     def prepare_transient_(self, aovs: Sequence[str]):
@@ -176,19 +201,59 @@ class TransientHDRFilm(mi.Film):
         * ray_weight: weight of the ray given by the sensor
         * active: mask
         """
-        pos_distance = (distance - self.start_opl) / self.bin_width_opl
-        coords = mi.Vector3f(pos.x, pos.y, pos_distance)
-        mask = (pos_distance >= 0) & (pos_distance < self.temporal_bins)
+        bin_idx, mask = self.transient_bin_(distance)
         self.transient_storage.put(
-            pos=coords,
+            pos=pos,
+            bin_idx=bin_idx,
             wavelengths=wavelengths,
             value=spec * ray_weight,
-            alpha=mi.Float(0.0),
+            # alpha and weight are left as Python constants so that
+            # the block does not issue atomics for them
+            alpha=0.0,
             # value should have the sample scale already multiplied
-            weight=mi.Float(0.0),
+            weight=0.0,
+            active=active & mask,
+        )
+
+    def add_transient_data_adjoint(self, pos: mi.Vector2f, distance: mi.Float,
+                                   wavelengths: mi.UnpolarizedSpectrum, spec: mi.Spectrum,
+                                   ray_weight: mi.Float, grad: mi.TensorXf,
+                                   active: mi.Bool) -> mi.UnpolarizedSpectrum:
+        """
+        Reverse-mode counterpart of ``add_transient_data``. Returns the path's
+        contribution weighted by the gradient of the developed transient image,
+        without materializing the transient image. Transient samples have zero
+        weight, so developing only drops channels and its adjoint is a gather:
+        * grad: gradient w.r.t. the transient image returned by ``develop()``
+        * other parameters: see ``add_transient_data``
+
+        See ``TransientImageBlock.put_adjoint`` for the returned value.
+        """
+        bin_idx, mask = self.transient_bin_(distance)
+        return self.transient_storage.put_adjoint(
+            pos=pos,
+            bin_idx=bin_idx,
+            wavelengths=wavelengths,
+            value=spec * ray_weight,
+            grad=grad,
             active=active & mask,
         )
 
+    def transient_bin_(self, distance: mi.Float):
+        pos_distance = dr.fma(distance, self.inv_bin_width_opl,
+                              self.neg_start_over_bin_width)
+        # Rays that miss the scene have infinite distances: map non-finite
+        # values to -1 and clamp the rest, so that the integer conversion
+        # below is always well-defined
+        pos_distance = dr.select(
+            dr.isfinite(pos_distance),
+            dr.clip(pos_distance, -1.0, self.temporal_bins), -1.0)
+        # Negative bins wrap around to large unsigned values, so a single
+        # comparison checks both ends of the [0, temporal_bins) range
+        bin_idx = mi.UInt32(mi.Int32(dr.floor(pos_distance)))
+        mask = bin_idx < self.temporal_bins
+        return bin_idx, mask
+
     def to_string(self):
         string = "TransientHDRFilm[\n"
         string += f"  size = {self.size()},\n"
@@ -213,6 +278,7 @@ class TransientHDRFilm(mi.Film):
 
     def parameters_changed(self, keys):
         super().parameters_changed(keys)
+        self.update_bin_constants_()
 
 
 mi.register_film("transient_hdr_film", lambda props: TransientHDRFilm(props))
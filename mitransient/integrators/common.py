@@ -5,7 +5,8 @@ import mitsuba as mi
 import drjit as dr
 # import gc
 
-from typing import Union, Any, Tuple, Sequence
+from contextlib import contextmanager
+from typing import Union, Any, Tuple
 
 from mitsuba.ad.integrators.common import ADIntegrator  # type: ignore
 from ..films.transient_hdr_film import TransientHDRFilm
@@ -25,6 +26,10 @@ class TransientADIntegrator(ADIntegrator):
         super().__init__(props)  # initialize props: max_depth and rr_depth
 
         self.camera_unwarp = props.get("camera_unwarp", False)
+        self.cache_primary_rays = props.get("cache_primary_rays", False)
+        self.megakernel = props.get("megakernel", True)
+        self.primary_rays_cache = {}
+        self.pass_seeds_cache = {}
         # TODO (diego): Figure out how to move these parameters to filter properties
         _ = props.get("gaussian_stddev", 0.5)
         _ = props.get("temporal_filter", "")
@@ -66,10 +71,26 @@ class TransientADIntegrator(ADIntegrator):
         needs_remainder = spp % spp_per_pass != 0
         num_passes = spp // spp_per_pass + 1 * needs_remainder
 
-        sampler.set_sample_count(num_passes)
-        sampler.set_samples_per_wavefront(num_passes)
-        sampler.seed(seed, num_passes)
-        seeds = mi.UInt32(sampler.next_1d() * 2**32)
+        # The per-pass seeds only depend on the sampler, seed and num_passes:
+        # reuse them across renders to avoid a kernel launch and a readback
+        # each time. Only the two most recently used entries are kept (the
+        # primal and gradient seeds of mi.render())
+        seeds_key = (id(original_sampler), seed, num_passes) \
+            if isinstance(seed, int) else None
+        seeds = self.pass_seeds_cache.pop(seeds_key, None)
+        if seeds is None:
+            sampler.set_sample_count(num_passes)
+            sampler.set_samples_per_wavefront(num_passes)
+            sampler.seed(seed, num_passes)
+            # Transfer all the seeds to the host at once: indexing the device
+            # array inside sampler_per_pass would read back (and synchronize)
+            # once per pass
+            seeds = mi.UInt32(sampler.next_1d() * 2**32).numpy()
+        if seeds_key is not None:
+            self.pass_seeds_cache[seeds_key] = seeds
+            while len(self.pass_seeds_cache) > 2:
+                del self.pass_seeds_cache[next(iter(self.pass_seeds_cache))]
+        pixel_count = dr.prod(film_size)
 
         def sampler_per_pass(i):
             if needs_remainder and i == num_passes - 1:
@@ -79,7 +100,7 @@ class TransientADIntegrator(ADIntegrator):
             sampler_clone = sensor.sampler().clone()
             sampler_clone.set_sample_count(spp_per_pass_i)
             sampler_clone.set_samples_per_wavefront(spp_per_pass_i)
-            sampler_clone.seed(seeds[i], dr.prod(film_size) * spp_per_pass_i)
+            sampler_clone.seed(int(seeds[i]), pixel_count * spp_per_pass_i)
             return sampler_clone, spp_per_pass_i
 
         return [sampler_per_pass(i) for i in range(num_passes)]
@@ -103,7 +124,7 @@ class TransientADIntegrator(ADIntegrator):
         self.check_transient_(scene, sensor)
 
         # Disable derivatives in all of the following
-        with dr.suspend_grad():
+        with dr.suspend_grad(), self.kernel_mode_():
             # Prepare the film and sample generator for rendering
             samplers_spps = self.prepare(
                 scene=scene,
@@ -122,7 +143,8 @@ class TransientADIntegrator(ADIntegrator):
             for i, (sampler_i, spp_i) in enumerate(samplers_spps):
 
                 # Generate a set of rays starting at the sensor
-                ray, weight, pos = self.sample_rays(scene, sensor, sampler_i)
+                ray, weight, pos, sampler_i = self.sample_rays_cached_(
+                    scene, sensor, sampler_i, seed, spp_i, i)
 
                 # Launch the Monte Carlo sampling process in primal mode
                 L, valid, aovs, _ = self.sample(
@@ -183,16 +205,51 @@ class TransientADIntegrator(ADIntegrator):
     def render_backward(self: mi.SamplingIntegrator,
                         scene: mi.Scene,
                         params: Any,
-                        grad_in: mi.TensorXf,
+                        grad_in: Tuple[mi.TensorXf, mi.TensorXf],
                         sensor: Union[int, mi.Sensor] = 0,
                         seed: mi.UInt32 = 0,
                         spp: int = 0) -> None:
+        """
+        Evaluates the reverse-mode derivative of the rendering step.
+
+        Follows radiative backpropagation: the path tracer is run once in
+        primal mode and once more in backward mode, which propagates the
+        adjoint radiance without recording an AD transcript of ``sample()``.
+        The steady adjoint is carried by ``δL``, while the transient adjoint
+        is gathered from ``grad_in`` at each transient sample
+        (see ``add_transient_adjoint_f``).
+
+        Besides the radiance ``L``, the state of the primal pass holds the
+        radiance weighted by the transient adjoint ``Lt`` (the transient
+        counterpart of ``δL * L``). As ``L``, it is subtracted at every bounce
+        of the backward pass, so that the BSDFs of the earlier vertices of a
+        path also receive the derivatives of its transient contributions.
+        """
         if isinstance(sensor, int):
             sensor = scene.sensors()[sensor]
 
         film = sensor.film()
         self.check_transient_(scene, sensor)
-        with dr.suspend_grad():
+
+        grad_in_image, grad_in_transient = grad_in
+
+        # The steady image only contributes through the adjoint radiance 'δL'.
+        # If it receives no gradient (e.g. a loss on the transient image only),
+        # the dummy splat below can be skipped
+        steady_grad = self.has_grad_(grad_in_image)
+        # Likewise, the transient image is never developed here: its gradient
+        # is gathered by each transient sample (see add_transient_adjoint_f)
+        transient_grad = self.has_grad_(grad_in_transient)
+
+        # Nothing to propagate
+        if not steady_grad and not transient_grad:
+            return
+
+        def no_transient(spec, distance, wavelengths, active):
+            return 0.0
+
+        # Disable derivatives in all of the following
+        with dr.suspend_grad(), self.kernel_mode_():
             # Prepare the film and sample generator for rendering
             samplers_spps = self.prepare(
                 scene=scene,
@@ -202,85 +259,208 @@ class TransientADIntegrator(ADIntegrator):
                 aovs=self.aov_names()
             )
 
-            # Generate a set of rays starting at the sensor, keep track of
-            # derivatives wrt. sample positions ('pos') if there are any
             total_spp = 0
-
             for _, spp_i in samplers_spps:
                 total_spp += spp_i
 
-        # with dr.suspend_grad():
-        for i, (sampler_i, spp_i) in enumerate(samplers_spps):
-            with dr.suspend_grad():
-                ray, weight, pos = self.sample_rays(scene, sensor, sampler_i)
-
-                with dr.resume_grad():
-                    L, valid, aovs, _ = self.sample(
-                        mode=dr.ADMode.Primal,
-                        scene=scene,
-                        sampler=sampler_i,
-                        ray=ray,
-                        depth=mi.UInt32(0),
-                        δL=None,
-                        δaovs=None,
-                        state_in=None,
-                        active=mi.Bool(True),
-                        add_transient=self.add_transient_f(
-                            film=film, pos=pos, ray_weight=weight, sample_scale=1.0 / total_spp
+            for i, (sampler_i, spp_i) in enumerate(samplers_spps):
+                # Generate a set of rays starting at the sensor
+                ray, weight, pos, sampler_i = self.sample_rays_cached_(
+                    scene, sensor, sampler_i, seed, spp_i, i)
+
+                if steady_grad:
+                    # Differentiate sample splatting and weight division steps to
+                    # retrieve the adjoint radiance (e.g. 'δL')
+                    with dr.resume_grad():
+                        L = dr.full(mi.Spectrum, 1.0, dr.width(ray))
+                        dr.enable_grad(L)
+                        aovs = []
+                        for _ in self.aov_names():
+                            aov = dr.ones(mi.Float, dr.width(ray))
+                            dr.enable_grad(aov)
+                            aovs.append(aov)
+
+                        # Prepare an ImageBlock as specified by the film
+                        block = film.steady.create_block()
+
+                        # Only use the coalescing feature when rendering enough samples
+                        block.set_coalesce(block.coalesce() and spp_i >= 4)
+
+                        ADIntegrator._splat_to_block(
+                            block, film, pos,
+                            value=L * weight,
+                            weight=1.0,
+                            alpha=1.0,
+                            aovs=[aov * weight for aov in aovs],
+                            wavelengths=ray.wavelengths
                         )
+
+                        film.steady.put_block(block)
+                        steady_image = film.steady.develop()
+
+                        dr.set_grad(steady_image, grad_in_image)
+                        dr.enqueue(dr.ADMode.Backward, steady_image)
+                        dr.traverse(dr.ADMode.Backward)
+
+                        δL = dr.grad(L)
+                        δaovs = dr.grad(aovs)
+
+                    # Clear the dummy data splatted on the film above
+                    film.clear()
+                else:
+                    # Without steady gradients 'δL' is zero
+                    δL, δaovs = None, None
+
+                if transient_grad:
+                    add_transient = self.add_transient_adjoint_f(
+                        film=film, pos=pos, ray_weight=weight, sample_scale=1.0 / total_spp,
+                        grad=grad_in_transient
                     )
-                    # Prepare an ImageBlock as specified by the film
-                    block = film.steady.create_block()
-
-                    # Only use the coalescing feature when rendering enough samples
-                    block.set_coalesce(block.coalesce() and spp_i >= 4)
-
-                    # Accumulate into the image block
-                    ADIntegrator._splat_to_block(
-                        block, film, pos,
-                        value=L * weight,
-                        weight=1.0,
-                        alpha=dr.select(valid, mi.Float(1), mi.Float(0)),
-                        aovs=aovs,
-                        wavelengths=ray.wavelengths
-                    )
+                else:
+                    add_transient = no_transient
 
-                    film.steady.put_block(block)
+                # Launch the Monte Carlo sampling process in primal mode (1).
+                # Only the state is needed: transient samples are not stored,
+                # add_transient only weights them by their adjoint
+                L, valid, aovs, state_out = self.sample(
+                    mode=dr.ADMode.Primal,
+                    scene=scene,
+                    sampler=sampler_i.clone(),
+                    ray=ray,
+                    depth=mi.UInt32(0),
+                    δL=None,
+                    δaovs=None,
+                    state_in=None,
+                    active=mi.Bool(True),
+                    add_transient=add_transient
+                )
 
-                    del valid
+                # Launch Monte Carlo sampling in backward AD mode (2)
+                L_2, valid_2, aovs_2, state_out_2 = self.sample(
+                    mode=dr.ADMode.Backward,
+                    scene=scene,
+                    sampler=sampler_i,
+                    ray=ray,
+                    depth=mi.UInt32(0),
+                    δL=δL,
+                    δaovs=δaovs,
+                    state_in=state_out,
+                    active=mi.Bool(True),
+                    add_transient=add_transient
+                )
 
-                    # This step launches a kernel
-                    dr.schedule(block.tensor())
-                    
-        steady_image, transient_image = film.develop()
+                # We don't need any of the outputs here
+                del L, valid, aovs, L_2, valid_2, aovs_2, state_out, state_out_2, \
+                    δL, δaovs, ray, weight, pos, sampler_i
 
-        # Differentiate sample splatting and weight division steps
-        grad_in_image, grad_in_transient = grad_in
-        # import pdb; pdb.set_trace()
-        # print(dr.sum(grad_in_image), dr.sum(grad_in_transient))
-        dr.set_grad(transient_image, grad_in_transient)
-        # dr.set_grad(steady_image, grad_in_image)
-        
-        # Replace traverse with manual backward pass
-        dr.enqueue(dr.ADMode.Backward, transient_image)
-        # dr.enqueue(dr.ADMode.Backward, steady_image)
-        dr.traverse(dr.ADMode.Backward) 
-            
-
-        del ray, weight, pos, block, sampler_i
-        # Clean up all variables
-        dr.eval()
+                # Run kernel representing side effects of the above
+                dr.eval()
+
+    @contextmanager
+    def kernel_mode_(self):
+        """
+        Record the loops and virtual function calls of ``sample()`` symbolically
+        (a single megakernel) if ``megakernel`` is enabled, or evaluate them
+        as a sequence of wavefront kernels otherwise.
+        """
+        with dr.scoped_set_flag(dr.JitFlag.SymbolicLoops, self.megakernel), \
+                dr.scoped_set_flag(dr.JitFlag.SymbolicCalls, self.megakernel):
+            yield
+
+    def has_grad_(self, grad: mi.TensorXf) -> bool:
+        """
+        Whether ``grad`` (a gradient w.r.t. one of the rendered images) can
+        be nonzero. Only the zero gradients known when tracing (``None`` or a
+        literal zero, e.g. the gradient of an image that does not contribute
+        to the loss) are detected, as checking the values would force a
+        synchronization with the device.
+        """
+        if grad is None:
+            return False
+        array = grad.array
+        return not (array.state == dr.VarState.Literal and array[0] == 0)
+
+    def sample_rays_cached_(self, scene: mi.Scene, sensor: mi.Sensor, sampler: mi.Sampler,
+                            seed: mi.UInt32, spp: int, pass_idx: int):
+        """
+        Wrapper around ``sample_rays()`` that also returns the sampler to be
+        used by ``sample()``. If ``cache_primary_rays`` is enabled, the rays
+        generated for a given sensor and pass are stored, together with the
+        state of the sampler after generating them, and reused by subsequent
+        renders with the same seed and sample count (e.g. in an optimization
+        loop where the sensor does not change). The last two entries of each
+        (sensor, pass) are kept: ``mi.render()`` uses a different seed for
+        ``render()`` and ``render_backward()``.
+        """
+        if not self.cache_primary_rays or not isinstance(seed, int):
+            ray, weight, pos = self.sample_rays(scene, sensor, sampler)
+            return ray, weight, pos, sampler
+
+        film = sensor.film()
+        sensor_key = (id(sensor), tuple(film.crop_size()), tuple(film.crop_offset()))
+        key = sensor_key + (pass_idx,)
+
+        # Invalidate the cache if the sensor or its film changed
+        if any(k[:len(sensor_key)] != sensor_key for k in self.primary_rays_cache):
+            self.primary_rays_cache = {}
+
+        # Entries of this (sensor, pass), the most recently used one last
+        entries = self.primary_rays_cache.setdefault(key, [])
+        entry = next((e for e in entries if e[0] == (seed, spp)), None)
+        if entry is None:
+            ray, weight, pos = self.sample_rays(scene, sensor, sampler)
+            # The sampler has consumed the dimensions used by the sensor
+            # (pixel jitter, aperture, time, wavelengths): store its state
+            # so that sample() continues from the same dimension on a hit
+            sampler.schedule_state()
+            dr.eval(ray, weight, pos)
+            entry = ((seed, spp), ray, weight, pos, sampler.clone())
+        else:
+            entries.remove(entry)
+        # Keep the primal and the gradient entries of mi.render()
+        entries[:] = entries[-1:] + [entry]
+
+        _, ray, weight, pos, cached_sampler = entry
+        return ray, weight, pos, cached_sampler.clone()
 
     def add_transient_f(self, film: TransientHDRFilm, pos: mi.Vector2f, ray_weight: mi.Float, sample_scale: mi.Float):
         """
-        Return a lambda function for saving transient samples.
-        It pre-multiplies the sample scale.
+        Return a function for saving transient samples.
+        It pre-multiplies the sample scale. As no adjoint is propagated when
+        rendering, the function returns zero (see ``add_transient_adjoint_f``).
         """
-        return (
-            lambda spec, distance, wavelengths, active: film.add_transient_data(
-                pos, distance, wavelengths, spec * sample_scale, ray_weight, active
+        # Fold the sample scale into the per-ray weight once, instead of
+        # rescaling every spectrum that is added to the film
+        sample_weight = ray_weight * sample_scale
+
+        def add_transient(spec, distance, wavelengths, active):
+            film.add_transient_data(
+                pos, distance, wavelengths, spec, sample_weight, active
             )
-        )
+            return 0.0
+
+        return add_transient
+
+    def add_transient_adjoint_f(self, film: TransientHDRFilm, pos: mi.Vector2f, ray_weight: mi.Float,
+                                sample_scale: mi.Float, grad: mi.TensorXf):
+        """
+        Return a function for back-propagating the gradient of the transient
+        image to transient samples (reverse-mode counterpart of
+        ``add_transient_f``). It pre-multiplies the sample scale.
+        The function returns the sample weighted by its adjoint, attached to
+        the AD graph of the sample: ``sample()`` back-propagates from it and
+        accumulates it (detached) to differentiate the earlier vertices of
+        the path.
+        """
+        sample_weight = ray_weight * sample_scale
+
+        def add_transient(spec, distance, wavelengths, active):
+            with dr.resume_grad():
+                return film.add_transient_data_adjoint(
+                    pos, distance, wavelengths, spec, sample_weight, grad, active
+                )
+
+        return add_transient
 
     def check_transient_(self, scene: mi.Scene, sensor: mi.Sensor):
         if isinstance(sensor, int):
@@ -322,155 +502,7 @@ class TransientRBIntegrator(TransientADIntegrator):
 
     Abstract base class of radiative-backpropagation style 
     transient integrators in ``mitransient``.
-    """
 
-    def render_backward(self: mi.SamplingIntegrator,
-                        scene: mi.Scene,
-                        params: Any,
-                        grad_in: Any,
-                        sensor: Union[int, mi.Sensor] = 0,
-                        seed: mi.UInt32 = 0,
-                        spp: int = 0) -> None:
-        """
-        Evaluates the reverse-mode derivative of the rendering step.
-        """
-        def splatting_and_backward_gradient_image(value: mi.Spectrum,
-                                                  weight: mi.Float,
-                                                  alpha: mi.Float,
-                                                  aovs: Sequence[mi.Float]):
-            '''
-            Backward propagation of the gradient image through the sample
-            splatting and weight division steps.
-            '''
-
-            # Prepare an ImageBlock as specified by the film
-            block = film.steady.create_block()
-
-            # Only use the coalescing feature when rendering enough samples
-            block.set_coalesce(block.coalesce() and spp >= 4)
-
-            ADIntegrator._splat_to_block(
-                block, film, pos,
-                value=value,
-                weight=weight,
-                alpha=alpha,
-                aovs=aovs,
-                wavelengths=ray.wavelengths
-            )
-
-            film.steady.put_block(block)
-
-            steady_image, transient_image = film.develop()
-
-            # Differentiate sample splatting and weight division steps
-            grad_in_image, grad_in_transient = grad_in
-            print(dr.sum(grad_in_image), dr.sum(grad_in_transient))
-            dr.set_grad(steady_image, grad_in_image)
-            dr.enqueue(dr.ADMode.Backward, steady_image)
-            dr.traverse(dr.ADMode.Backward)
-        
-        
-        if isinstance(sensor, int):
-            sensor = scene.sensors()[sensor]
-        film = sensor.film()
-        self.check_transient_(scene, sensor)
-
-        with dr.suspend_grad():
-            # Prepare the film and sample generator for rendering
-            samplers_spps = self.prepare(
-                scene=scene,
-                sensor=sensor,
-                seed=seed,
-                spp=spp,
-                aovs=self.aov_names()
-            )
-
-            # Generate a set of rays starting at the sensor, keep track of
-            # derivatives wrt. sample positions ('pos') if there are any
-            total_spp = 0
-
-            for _, spp_i in samplers_spps:
-                total_spp += spp_i
-
-        for i, (sampler_i, spp_i) in enumerate(samplers_spps):
-            with dr.suspend_grad():
-                ray, weight, pos = self.sample_rays(scene, sensor, sampler_i)
-            
-                # Differentiate sample splatting and weight division steps to
-                # retrieve the adjoint radiance (e.g. 'δL')
-                with dr.resume_grad():
-                    L = dr.full(mi.Spectrum, 1.0, dr.width(ray))
-                    dr.enable_grad(L)
-                    aovs = []
-                    for _ in self.aov_names():
-                        aov = dr.ones(mi.Float, dr.width(ray))
-                        dr.enable_grad(aov)
-                        aovs.append(aov) 
-
-                    # Prepare an ImageBlock as specified by the film
-                    block = film.steady.create_block()
-
-                    # Only use the coalescing feature when rendering enough samples
-                    block.set_coalesce(block.coalesce() and spp >= 4)
-
-                    ADIntegrator._splat_to_block(
-                        block, film, pos,
-                        value=L * weight,
-                        weight=1.0,
-                        alpha=1.0,
-                        aovs=[aov * weight for aov in aovs],
-                        wavelengths=ray.wavelengths
-                    )
-
-                    film.steady.put_block(block)
-
-                    steady_image, transient_image = film.develop()
-
-                    # Differentiate sample splatting and weight division steps
-                    grad_in_image, grad_in_transient = grad_in
-                    # print(dr.sum(grad_in_image), dr.sum(grad_in_transient))
-                    # dr.set_grad(steady_image, grad_in_image)
-                    # dr.enqueue(dr.ADMode.Backward, steady_image)
-                    dr.enqueue(dr.ADMode.Backward, transient_image)
-                    dr.traverse(dr.ADMode.Backward)
-
-                    δL = dr.grad(L)
-                    δaovs = dr.grad(aovs)
-
-                    # Clear the dummy data splatted on the film above
-                    film.clear()
-
-                    # Launch the Monte Carlo sampling process in primal mode (1)
-                    L, valid, aovs, state_out = self.sample(
-                        mode=dr.ADMode.Primal,
-                        scene=scene,
-                        sampler=sampler_i.clone(),
-                        ray=ray,
-                        depth=mi.UInt32(0),
-                        δL=None,
-                        δaovs=None,
-                        state_in=None,
-                        active=mi.Bool(True),
-                        add_transient=self.add_transient_f(
-                            film=film, pos=pos, ray_weight=weight, sample_scale=1.0 / total_spp
-                        )
-                    )
-
-                    L_2, valid_2, aovs_2, state_out_2 = self.sample(
-                        mode=dr.ADMode.Backward,
-                        scene=scene,
-                        sampler=sampler_i,
-                        ray=ray,
-                        depth=mi.UInt32(0),
-                        δL=δL,
-                        δaovs=δaovs,
-                        state_in=state_out,
-                        active=mi.Bool(True),
-                        add_transient=self.add_transient_f(
-                            film=film, pos=pos, ray_weight=weight, sample_scale=1.0 / total_spp
-                        )
-                    )
-
-                    del L_2, valid_2, aovs_2, state_out, state_out_2, δL, δaovs, ray, weight, pos, sampler_i
-                    dr.eval()
-                    return
\ No newline at end of file
+    ``render_backward()`` is inherited from ``TransientADIntegrator``,
+    which already follows the radiative backpropagation scheme.
+    """
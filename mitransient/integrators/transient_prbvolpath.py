@@ -105,12 +105,13 @@ class TransientPRBVolpathIntegrator(TransientRBIntegrator):
                sampler: mi.Sampler,
                ray: mi.Ray3f,
                δL: Optional[mi.Spectrum],
-               state_in: Optional[mi.Spectrum],
+               state_in: Optional[Tuple[mi.Spectrum, mi.Spectrum]],
                active: mi.Bool,
                # TODO (JORGE): revise
-               add_transient: Callable[[Any, Any, Any, Any], None],
+               # add_transient returns the spectrum weighted by its transient adjoint
+               add_transient: Callable[[Any, Any, Any, Any], Any],
                **kwargs  # Absorbs unused arguments
-               ) -> Tuple[mi.Spectrum, mi.Bool, List[mi.Float], mi.Spectrum]:
+               ) -> Tuple[mi.Spectrum, mi.Bool, List[mi.Float], Tuple[mi.Spectrum, mi.Spectrum]]:
         self.prepare_scene(scene)
 
         if mode == dr.ADMode.Forward:
@@ -121,7 +122,9 @@ class TransientPRBVolpathIntegrator(TransientRBIntegrator):
 
         ray = mi.Ray3f(ray)
         depth = mi.UInt32(0)                          # Depth of current vertex
-        L = mi.Spectrum(0 if is_primal else state_in)  # Radiance accumulator
+        L = mi.Spectrum(0 if is_primal else state_in[0])  # Radiance accumulator
+        # Radiance weighted by the adjoint of the transient image
+        Lt = mi.Spectrum(0 if is_primal else state_in[1])
         # Differential/adjoint radiance
         δL = mi.Spectrum(δL if δL is not None else 0)
         throughput = mi.Spectrum(1)                   # Path throughput weight
@@ -227,7 +230,11 @@ class TransientPRBVolpathIntegrator(TransientRBIntegrator):
                 if dr.hint(not is_primal and dr.grad_enabled(weight), mode='scalar'):
                     Lo = dr.detach(
                         dr.select(active_medium | escaped_medium, L / dr.maximum(1e-8, weight), 0.0))
-                    dr.backward(δL * weight * Lo)
+                    Lo_t = dr.detach(
+                        dr.select(active_medium | escaped_medium, Lt / dr.maximum(1e-8, weight), 0.0))
+                    δLo = weight * (δL * Lo + Lo_t)
+                    if dr.hint(dr.grad_enabled(δLo), mode='scalar'):
+                        dr.backward(δLo)
 
                 phase_ctx = mi.PhaseFunctionContext(sampler)
                 phase = mei.medium.phase_function()
@@ -259,11 +266,15 @@ class TransientPRBVolpathIntegrator(TransientRBIntegrator):
                 emitted = emitter.eval(si, active_e)
                 contrib = dr.select(count_direct, throughput * emitted,
                                     throughput * mis_weight(last_scatter_direction_pdf, emitter_pdf) * emitted)
+                contrib_t = add_transient(
+                    contrib, distance, ray.wavelengths, active_e)
                 L[active_e] += dr.detach(contrib if is_primal else -contrib)
-                if dr.hint(not is_primal and dr.grad_enabled(contrib), mode='scalar'):
-                    dr.backward(δL * contrib)
-
-                add_transient(contrib, distance, ray.wavelengths, active_e)
+                Lt[active_e] += dr.detach(contrib_t if is_primal else -contrib_t)
+                if dr.hint(not is_primal, mode='scalar'):
+                    # 'δL' is zero if the steady image has no gradient
+                    δLo = δL * contrib + contrib_t
+                    if dr.hint(dr.grad_enabled(δLo), mode='scalar'):
+                        dr.backward(δLo)
 
                 active_surface &= si.is_valid()
                 ctx = mi.BSDFContext()
@@ -297,18 +308,19 @@ class TransientPRBVolpathIntegrator(TransientRBIntegrator):
 
                     contrib = throughput * nee_weight * \
                         mis_weight(ds.pdf, nee_directional_pdf) * emitted
+                    contrib_t = add_transient(contrib, distance + ds.dist *
+                                              η, ray.wavelengths, active_e)
                     L[active_e] += dr.detach(contrib if is_primal else -contrib)
+                    Lt[active_e] += dr.detach(contrib_t if is_primal else -contrib_t)
 
                     if dr.hint(not is_primal, mode='scalar'):
                         self.sample_emitter(mei, si, active_e_medium, active_e_surface,
                                             scene, nee_sampler, medium, channel, active_e, adj_emitted=contrib,
-                                            δL=δL, mode=mode)
-
-                        if dr.hint(dr.grad_enabled(nee_weight) or dr.grad_enabled(emitted), mode='scalar'):
-                            dr.backward(δL * contrib)
+                                            adj_emitted_t=contrib_t, δL=δL, mode=mode)
 
-                    add_transient(contrib, distance + ds.dist *
-                                  η, ray.wavelengths, active_e)
+                        δLo = δL * contrib + contrib_t
+                        if dr.hint(dr.grad_enabled(δLo), mode='scalar'):
+                            dr.backward(δLo)
 
                 # -------------------- Phase function sampling ------------------
 
@@ -330,7 +342,12 @@ class TransientPRBVolpathIntegrator(TransientRBIntegrator):
                         dr.detach(dr.select(act_medium_scatter, L /
                                   dr.maximum(1e-8, phase_eval), 0.0))
                     if mode == dr.ADMode.Backward:
-                        dr.backward_from(δL * Lo)
+                        Lo_t = phase_eval * \
+                            dr.detach(dr.select(act_medium_scatter, Lt /
+                                      dr.maximum(1e-8, phase_eval), 0.0))
+                        δLo = δL * Lo + Lo_t
+                        if dr.hint(dr.grad_enabled(δLo), mode='scalar'):
+                            dr.backward_from(δLo)
                     else:
                         δL += dr.forward_to(Lo)
 
@@ -357,7 +374,12 @@ class TransientPRBVolpathIntegrator(TransientRBIntegrator):
                         dr.detach(dr.select(active_surface, L /
                                   dr.maximum(1e-8, bsdf_eval), 0.0))
                     if dr.hint(mode == dr.ADMode.Backward, mode='scalar'):
-                        dr.backward_from(δL * Lo)
+                        Lo_t = bsdf_eval * \
+                            dr.detach(dr.select(active_surface, Lt /
+                                      dr.maximum(1e-8, bsdf_eval), 0.0))
+                        δLo = δL * Lo + Lo_t
+                        if dr.hint(dr.grad_enabled(δLo), mode='scalar'):
+                            dr.backward_from(δLo)
                     else:
                         δL += dr.forward_to(Lo)
 
@@ -384,11 +406,11 @@ class TransientPRBVolpathIntegrator(TransientRBIntegrator):
                 medium[has_medium_trans] = si.target_medium(ray.d)
                 active &= (active_surface | active_medium)
 
-        return L if is_primal else δL, valid_ray, [], L
+        return L if is_primal else δL, valid_ray, [], (L, Lt)
 
     @dr.syntax
     def sample_emitter(self, mei, si, active_medium, active_surface, scene, sampler, medium, channel,
-                       active, adj_emitted=None, δL=None, mode=None):
+                       active, adj_emitted=None, adj_emitted_t=0.0, δL=None, mode=None):
         is_primal = mode == dr.ADMode.Primal
 
         active = mi.Bool(active)
@@ -467,7 +489,7 @@ class TransientPRBVolpathIntegrator(TransientRBIntegrator):
                 active_adj = (active_surface | active_medium) & (
                     tr_multiplier > 0.0)
                 dr.backward(tr_multiplier * dr.detach(dr.select(active_adj,
-                            δL * adj_emitted / tr_multiplier, 0.0)))
+                            (δL * adj_emitted + adj_emitted_t) / tr_multiplier, 0.0)))
 
             transmittance *= dr.detach(tr_multiplier)
 
@@ -3,6 +3,7 @@ from typing import Optional, Tuple, List, Callable
 
 import drjit as dr
 import mitsuba as mi
+import numpy as np
 from mitsuba import Log, LogLevel
 from mitsuba.ad.integrators.common import mis_weight  # type: ignore
 
@@ -67,6 +68,13 @@ class TransientNLOSPath(TransientADIntegrator):
          If True, points in the relay wall can be sampled.
          See [Royo2022] for more information about Hidden Geometry Sampling (default: false)
 
+     * - min_throughput
+       - |float|
+       - Paths whose throughput falls below this value are terminated, which
+         avoids tracing (and adding transient samples of) paths with a
+         negligible contribution. Note that this introduces some bias.
+         A value of 0 disables this feature (default: 0 i.e. disabled)
+
      * - temporal_filter
        - |string|
        - Can be either:
@@ -77,6 +85,20 @@ class TransientNLOSPath(TransientADIntegrator):
 
          IMPORTANT: RECOMMENDED TO SET TO 'box' FOR NLOS SIMULATIONS. (default: empty string)
 
+     * - cache_primary_rays
+       - |bool|
+       - If True, the rays generated at the sensor are stored and reused in
+         subsequent renders with the same sensor, film size, seed and sample
+         count. Useful in optimization loops where the sensor does not change.
+         Do not enable it if the sensor parameters are modified. (default: false)
+
+     * - megakernel
+       - |bool|
+       - If True, the path tracing loop and its virtual function calls are
+         compiled into a single kernel (Dr.Jit symbolic mode). If False,
+         they are evaluated as a sequence of wavefront kernels, which can
+         help when debugging. (default: true)
+
      * - block_size
        - |int|
        - Size of (square) image blocks to render in parallel (in scalar mode).
@@ -124,6 +146,7 @@ class TransientNLOSPath(TransientADIntegrator):
             and
             self.hg_sampling
         )
+        self.min_throughput: float = props.get('min_throughput', 0.0)
         self.hg_sampling_includes_relay_wall: bool = (
             props.get('nlos_hidden_geometry_sampling_includes_relay_wall', False)
             and
@@ -141,36 +164,31 @@ class TransientNLOSPath(TransientADIntegrator):
                 f'You have defined multiple ({len(scene_emitters)}) emitters in the scene with a NLOS capture meter. You should have only 1.')
 
         if self.hg_sampling:
-            # NOTE (Miguel) : Improved hidden geometry sampling via vectorization.
-            # There is a bug that does not allow this currently. Uncomment it after nanobind upgrade
-            # ------------------------------------------------------------------------------------
-            # valid_object = (scene.shapes_dr() != mi.ShapePtr(sensor.get_shape())) | self.hg_sampling_includes_relay_wall
-
-            # # surface_areas = scene.shapes_dr().surface_area()
-            # surface_areas = scene.shapes_dr().surface_area()
-            # pdf_hidden_area = dr.gather(mi.Float,
-            #                             surface_areas,
-            #                             dr.arange(mi.UInt, dr.width(scene.shapes_dr())),
-            #                             valid_object)
-
-            # self.hidden_geometries_distribution = mi.DiscreteDistribution(pdf_hidden_area)
-            # ------------------------------------------------------------------------------------
-            surface_areas = []
-            for shape in scene.shapes():
-                surface_areas.append(
-                    0.0 if (shape == sensor.get_shape()
-                            and not self.hg_sampling_includes_relay_wall) else shape.surface_area()[0]
-                )
-
-            if len(surface_areas) == 0:
+            # Compute all the surface areas with a single vectorized call
+            # (same order as scene.shapes_dr(), which is used for sampling)
+            shapes = scene.shapes_dr()
+            if dr.width(shapes) == 0:
                 raise AssertionError('Hidden geometry sampling is activated, '
                                      'but there are no hidden geometries in the scene!')
-            if sum(surface_areas) < dr.epsilon(mi.Float):
+
+            surface_areas = shapes.surface_area()
+            if not self.hg_sampling_includes_relay_wall:
+                is_relay_wall = shapes == mi.ShapePtr(sensor.get_shape())
+                surface_areas = dr.select(is_relay_wall, 0.0, surface_areas)
+
+            if dr.sum(surface_areas) < dr.epsilon(mi.Float):
                 raise AssertionError('Hidden geometry sampling is activated, '
                                      'but the hidden geometry in the scene has zero surface area?')
 
-            self.hidden_geometries_distribution = mi.DiscreteDistribution(
-                surface_areas)
+            # Alias table: sampling a shape takes O(1) gathers instead of a
+            # binary search over the CDF. The tables are kept opaque so that
+            # they are not baked into the kernel (e.g. for a single shape)
+            pmf, prob, alias = self._build_alias_table(surface_areas.numpy())
+            self.hg_alias_pmf = mi.Float(pmf.astype(np.float32))
+            self.hg_alias_prob = mi.Float(prob.astype(np.float32))
+            self.hg_alias_index = mi.UInt32(alias.astype(np.uint32))
+            dr.make_opaque(self.hg_alias_pmf, self.hg_alias_prob, self.hg_alias_index)
+            self.hg_alias_size = len(pmf)
 
         # prepare laser sampling by precomputing the laser focusing point in the geometry
         if self.laser_sampling:
@@ -186,9 +204,60 @@ class TransientNLOSPath(TransientADIntegrator):
             assert dr.all(si.is_valid()), \
                 'The emitter is not pointing at the scene!'
             self.nlos_laser_target: mi.Point3f = si.p
+            # Not baked into the kernel: moving the laser reuses the same kernel
+            dr.make_opaque(self.nlos_laser_target)
+
+        # Opaque copies of the depth parameters used inside the sampling loop,
+        # so that changing them reuses the same compiled kernel
+        self.max_depth_opaque = dr.opaque(mi.UInt32, self.max_depth)
+        self.rr_depth_opaque = dr.opaque(mi.UInt32, self.rr_depth)
+        self.filter_depth_opaque = dr.opaque(mi.UInt32, max(self.filter_depth, 0))
 
         return super().prepare(scene, sensor, seed, spp, aovs)
 
+    @staticmethod
+    def _build_alias_table(weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Build an alias table for sampling proportionally to ``weights``.
+        Returns the normalized pmf, and for each entry the probability of
+        keeping it and the index of its alias.
+
+        Uses the sweeping construction of Hübschle-Schneider and Sanders,
+        written with prefix sums so that it is vectorized: the light entries
+        (below the average) are filled in order by the heavy ones, and each
+        heavy entry is filled by the next heavy entry once it is drained.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        n = len(weights)
+        pmf = weights / np.sum(weights)
+        scaled = pmf * n
+        prob = np.ones(n)
+        alias = np.arange(n)
+
+        light = np.flatnonzero(scaled < 1.0)
+        heavy = np.flatnonzero(scaled >= 1.0)
+        if len(light) > 0:
+            # Deficit of the light entries before each of them, and excess
+            # of the heavy entries up to (and including) each of them
+            deficit = np.concatenate(([0.0], np.cumsum(1.0 - scaled[light])))
+            excess = np.cumsum(scaled[heavy] - 1.0)
+
+            # A light entry is filled by the first heavy entry whose
+            # cumulative excess covers the deficit before it
+            donor = np.searchsorted(excess, deficit[:-1], side='left')
+            prob[light] = scaled[light]
+            alias[light] = heavy[np.minimum(donor, len(heavy) - 1)]
+
+            # What is left of a heavy entry once the following light entries
+            # are served by the next one (the last one keeps prob = 1, up to
+            # rounding errors)
+            served = np.searchsorted(deficit[:-1], excess, side='right')
+            residual = np.clip(excess + 1.0 - deficit[served], 0.0, 1.0)
+            prob[heavy[:-1]] = residual[:-1]
+            alias[heavy[:-1]] = heavy[1:]
+
+        return pmf, prob, alias
+
     @dr.syntax
     def _sample_hidden_geometry_position(
             self, ref: mi.Interaction3f, scene: mi.Scene,
@@ -224,10 +293,19 @@ class TransientNLOSPath(TransientADIntegrator):
         #     return self.hidden_geometries[0].sample_position(
         #         ref.time, sample2, active)
 
-        index, new_sample, shape_pdf = \
-            self.hidden_geometries_distribution.sample_reuse_pmf(
-                sample2.x, active)
-        sample2.x = new_sample
+        # Sample a shape using the alias table, then rescale
+        # the sample so that it can be reused for the position
+        n = self.hg_alias_size
+        u = sample2.x * n
+        i = dr.minimum(mi.UInt32(u), n - 1)
+        coin = u - mi.Float(i)
+        prob = dr.gather(mi.Float, self.hg_alias_prob, i, active)
+        use_alias = coin >= prob
+        index = dr.select(
+            use_alias, dr.gather(mi.UInt32, self.hg_alias_index, i, active), i)
+        sample2.x = dr.select(
+            use_alias, (coin - prob) / (1.0 - prob), coin / prob)
+        shape_pdf = dr.gather(mi.Float, self.hg_alias_pmf, index, active)
 
         shape: mi.ShapePtr = dr.gather(
             mi.ShapePtr, scene.shapes_dr(), index, active)
@@ -240,7 +318,7 @@ class TransientNLOSPath(TransientADIntegrator):
             self, mode: dr.ADMode, scene: mi.Scene, sampler: mi.Sampler,
             si: mi.SurfaceInteraction3f, bsdf: mi.BSDF, bsdf_ctx: mi.BSDFContext,
             β: mi.Spectrum, distance: mi.Float, η: mi.Float, depth: mi.UInt,
-            active_e: mi.Bool, add_transient) -> mi.Spectrum:
+            active_e: mi.Bool, add_transient) -> Tuple[mi.Spectrum, mi.Spectrum]:
         ds, em_weight = scene.sample_emitter_direction(
             ref=si, sample=sampler.next_2d(active_e), test_visibility=True, active=active_e)
         active_e &= (ds.pdf != 0.0)
@@ -263,21 +341,21 @@ class TransientNLOSPath(TransientADIntegrator):
 
             Lr_dir = mi.Spectrum(0)
             if self.filter_depth != -1:
-                active_e &= (depth == self.filter_depth)
+                active_e &= (depth == self.filter_depth_opaque)
             if self.discard_direct_paths:
                 active_e &= depth > 2
             Lr_dir[active_e] = β * bsdf_spec * em_weight
 
-        add_transient(Lr_dir, distance + ds.dist * η,
-                      si.wavelengths, active_e)
+        Lr_dir_t = add_transient(Lr_dir, distance + ds.dist * η,
+                                 si.wavelengths, active_e)
 
-        return Lr_dir
+        return Lr_dir, Lr_dir_t
 
     def emitter_laser_sample(
             self, mode: dr.ADMode, scene: mi.Scene, sampler: mi.Sampler,
             si: mi.SurfaceInteraction3f, bsdf: mi.BSDF, bsdf_ctx: mi.BSDFContext,
             β: mi.Spectrum, distance: mi.Float, η: mi.Float, depth: mi.UInt,
-            active_e: mi.Bool, add_transient) -> mi.Spectrum:
+            active_e: mi.Bool, add_transient) -> Tuple[mi.Spectrum, mi.Spectrum]:
         """
         NLOS scenes only have one laser emitter - standard
         emitter sampling techniques do not apply as most
@@ -295,21 +373,25 @@ class TransientNLOSPath(TransientADIntegrator):
         # 1. Obtain direction to NLOS illuminated point
         #    and test visibility with ray_test
         d = self.nlos_laser_target - si.p
-        distance_laser = dr.norm(d)
-        d /= distance_laser
+        distance_laser_sqr = dr.squared_norm(d)
+        inv_distance_laser = dr.rsqrt(distance_laser_sqr)
+        distance_laser = distance_laser_sqr * inv_distance_laser
+        d *= inv_distance_laser
         ray_bsdf = si.spawn_ray_to(self.nlos_laser_target)
         active_e &= ~scene.ray_test(ray_bsdf, active_e)
 
         # 2. Evaluate BSDF to desired direction
         wo = si.to_local(d)
         bsdf_spec = bsdf.eval(ctx=bsdf_ctx, si=si, wo=wo, active=active_e)
-        bsdf_spec = si.to_world_mueller(bsdf_spec, -wo, si.wi)
+        if mi.is_polarized:
+            bsdf_spec = si.to_world_mueller(bsdf_spec, -wo, si.wi)
 
         ray_bsdf.maxt = dr.inf
         si_bsdf: mi.SurfaceInteraction3f = scene.ray_intersect(
             ray_bsdf, active_e)
         active_e &= si_bsdf.is_valid()
-        active_e &= dr.any(mi.depolarizer(bsdf_spec) > dr.epsilon(mi.Float))
+        bsdf_spec_u = mi.depolarizer(bsdf_spec) if mi.is_polarized else bsdf_spec
+        active_e &= dr.any(bsdf_spec_u > dr.epsilon(mi.Float))
 
         wl = si_bsdf.to_local(-d)
         active_e &= mi.Frame3f.cos_theta(wl) > 0.0
@@ -317,7 +399,7 @@ class TransientNLOSPath(TransientADIntegrator):
         # NOTE(diego): convert from area probability to solid angle probability
         #              (similar to sampling an area light)
         #              divide by pdf
-        pdf_ls *= dr.sqr(distance_laser) / mi.Frame3f.cos_theta(wl)
+        pdf_ls *= distance_laser_sqr / mi.Frame3f.cos_theta(wl)
         bsdf_spec /= pdf_ls
 
         bsdf_next = si_bsdf.bsdf(ray=ray_bsdf)
@@ -339,8 +421,8 @@ class TransientNLOSPath(TransientADIntegrator):
         ps_hg: mi.PositionSample3f = self._sample_hidden_geometry_position(
             ref=si, scene=scene, sample2=sample2, active=active)
         d = mi.Vector3f(ps_hg.p - si.p)
-        dist = dr.norm(d)
-        d /= dist
+        dist_sqr = dr.squared_norm(d)
+        d *= dr.rsqrt(dist_sqr)
         cos_theta_i = dr.dot(si.n, d)
         cos_theta_g = dr.dot(ps_hg.n, -d)
         active &= (cos_theta_i > dr.epsilon(mi.Float)) & \
@@ -348,11 +430,12 @@ class TransientNLOSPath(TransientADIntegrator):
 
         wo = si.to_local(d)
         bsdf_spec = bsdf.eval(ctx=bsdf_ctx, si=si, wo=wo, active=active)
-        bsdf_spec = si.to_world_mueller(bsdf_spec, -wo, si.wi)
+        if mi.is_polarized:
+            bsdf_spec = si.to_world_mueller(bsdf_spec, -wo, si.wi)
 
         bs: mi.BSDFSample3f = dr.zeros(mi.BSDFSample3f)
         bs.wo = wo
-        bs.pdf = ps_hg.pdf * dr.sqr(dist) / dr.abs(cos_theta_g)
+        bs.pdf = ps_hg.pdf * dist_sqr / dr.abs(cos_theta_g)
         bs.eta = 1.0
         bs.sampled_type = mi.UInt32(mi.BSDFFlags.Reflection)
         bs.sampled_component = 0
@@ -369,12 +452,13 @@ class TransientNLOSPath(TransientADIntegrator):
                sampler: mi.Sampler,
                ray: mi.Ray3f,
                δL: Optional[mi.Spectrum],
-               state_in: Optional[mi.Spectrum],
+               state_in: Optional[Tuple[mi.Spectrum, mi.Spectrum]],
                active: mi.Bool,
                # add_transient accepts (spec, distance, wavelengths, active)
-               add_transient: Callable[[mi.Spectrum, mi.Float, mi.UnpolarizedSpectrum, mi.Bool], None],
+               # add_transient returns the spectrum weighted by its transient adjoint
+               add_transient: Callable[[mi.Spectrum, mi.Float, mi.UnpolarizedSpectrum, mi.Bool], mi.Spectrum],
                **kwargs  # Absorbs unused arguments
-               ) -> Tuple[mi.Spectrum, mi.Bool, List[mi.Float], mi.Spectrum]:
+               ) -> Tuple[mi.Spectrum, mi.Bool, List[mi.Float], Tuple[mi.Spectrum, mi.Spectrum]]:
         """
         See ``TransientADIntegrator.sample()`` for a description of this interface and
         the role of the various parameters and return values.
@@ -391,7 +475,9 @@ class TransientNLOSPath(TransientADIntegrator):
         # Copy input arguments to avoid mutating the caller's state
         ray = mi.Ray3f(dr.detach(ray))
         depth = mi.UInt32(0)                          # Depth of current vertex
-        L = mi.Spectrum(0 if primal else state_in)    # Radiance accumulator
+        L = mi.Spectrum(0 if primal else state_in[0])  # Radiance accumulator
+        # Radiance weighted by the adjoint of the transient image
+        Lt = mi.Spectrum(0 if primal else state_in[1])
         # Differential/adjoint radiance
         δL = mi.Spectrum(δL if δL is not None else 0)
         β = mi.Spectrum(1)                            # Path throughput weight
@@ -400,9 +486,11 @@ class TransientNLOSPath(TransientADIntegrator):
         distance = mi.Float(ray.time)                 # Distance of the path
 
         # Variables caching information from the previous bounce
-        prev_si = dr.zeros(mi.SurfaceInteraction3f)
-        prev_bsdf_pdf = mi.Float(1.0)
-        prev_bsdf_delta = mi.Bool(True)
+        # (only the Interaction3f fields are needed for MIS, which keeps the
+        # loop state much smaller than a full SurfaceInteraction3f)
+        prev_si = dr.zeros(mi.Interaction3f)
+        # A negative pdf flags a delta BSDF sample (saves a loop variable)
+        prev_bsdf_pdf = mi.Float(-1.0)
 
         if self.camera_unwarp:
             raise AssertionError(
@@ -441,27 +529,28 @@ class TransientNLOSPath(TransientADIntegrator):
             ds = mi.DirectionSample3f(scene, si=si, ref=prev_si)
 
             mis = mis_weight(
-                prev_bsdf_pdf,
-                scene.pdf_emitter_direction(prev_si, ds, ~prev_bsdf_delta)
+                dr.abs(prev_bsdf_pdf),
+                scene.pdf_emitter_direction(prev_si, ds, prev_bsdf_pdf >= 0)
             )
 
             with dr.resume_grad(when=not primal):
                 Le = β * mis * ds.emitter.eval(si, active_next)
 
-            # Add transient contribution because of emitter found
-            add_transient(Le, distance, ray.wavelengths, active)
+            # Add transient contribution because of emitter found (only lanes
+            # where the emitter was evaluated can hold a nonzero value)
+            Le_t = add_transient(Le, distance, ray.wavelengths, active_next)
 
             # ---------------------- Emitter sampling ----------------------
 
             # Should we continue tracing to reach one more vertex?
-            active_next &= (depth + 1 < self.max_depth) & si.is_valid()
+            active_next &= (depth + 1 < self.max_depth_opaque) & si.is_valid()
 
             # Is emitter sampling even possible on the current vertex?
             active_em = active_next & mi.has_flag(
                 bsdf.flags(), mi.BSDFFlags.Smooth)
 
             # Uses NEE or laser sampling depending on self.laser_sampling
-            Lr_dir = emitter_sample_f(
+            Lr_dir, Lr_dir_t = emitter_sample_f(
                 mode, scene, sampler,
                 si, bsdf, bsdf_ctx,
                 β, distance, η, depth,
@@ -469,8 +558,9 @@ class TransientNLOSPath(TransientADIntegrator):
 
             # ------------------ Detached BSDF sampling -------------------
 
-            do_hg_sample = mi.Bool(False)
-            if self.hg_sampling and self.hg_sampling_do_rroulette:
+            # The sampling technique(s) are known at trace time, so only
+            # the ones that can actually be chosen are traced
+            if dr.hint(self.hg_sampling_do_rroulette, mode='scalar'):
                 # choose HG or BSDF sampling with Russian Roulette
                 hg_prob = mi.Float(0.5)
                 do_hg_sample = sampler.next_1d(active) < hg_prob
@@ -478,53 +568,65 @@ class TransientNLOSPath(TransientADIntegrator):
                     do_hg_sample,
                     hg_prob,
                     mi.Float(1.0) - hg_prob)
+
+                active_hg = active_next & do_hg_sample
+                bsdf_sample_hg, bsdf_weight_hg = self.hidden_geometry_sample(
+                    scene, sampler, bsdf,
+                    bsdf_ctx, si, sampler.next_1d(), sampler.next_2d(), active_hg)
+
+                active_nhg = active_next & (~do_hg_sample)
+                bsdf_sample_nhg, bsdf_weight_nhg = bsdf.sample(
+                    bsdf_ctx, si, sampler.next_1d(), sampler.next_2d(), active_nhg)
+
+                bsdf_sample = dr.select(
+                    do_hg_sample, bsdf_sample_hg, bsdf_sample_nhg)
+                bsdf_weight = dr.select(
+                    do_hg_sample, bsdf_weight_hg, bsdf_weight_nhg)
+            elif dr.hint(self.hg_sampling, mode='scalar'):
+                # only hidden geometry sampling
+                pdf_bsdf_method = mi.Float(1.0)
+                bsdf_sample, bsdf_weight = self.hidden_geometry_sample(
+                    scene, sampler, bsdf,
+                    bsdf_ctx, si, sampler.next_1d(), sampler.next_2d(), active_next)
             else:
-                # only one option
-                do_hg_sample = mi.Bool(self.hg_sampling)
+                # only material sampling
                 pdf_bsdf_method = mi.Float(1.0)
-
-            active_hg = active_next & do_hg_sample
-            bsdf_sample_hg, bsdf_weight_hg = self.hidden_geometry_sample(
-                scene, sampler, bsdf,
-                bsdf_ctx, si, sampler.next_1d(), sampler.next_2d(), active_hg)
-
-            active_nhg = active_next & (~do_hg_sample)
-            bsdf_sample_nhg, bsdf_weight_nhg = bsdf.sample(
-                bsdf_ctx, si, sampler.next_1d(), sampler.next_2d(), active_nhg)
-
-            bsdf_sample = dr.select(
-                do_hg_sample, bsdf_sample_hg, bsdf_sample_nhg)
-            bsdf_weight = dr.select(
-                do_hg_sample, bsdf_weight_hg, bsdf_weight_nhg)
+                bsdf_sample, bsdf_weight = bsdf.sample(
+                    bsdf_ctx, si, sampler.next_1d(), sampler.next_2d(), active_next)
 
             # ---- Update loop variables based on current interaction -----
 
             L = (L + Le + Lr_dir) if primal else (L - Le - Lr_dir)
+            Lt_dir = dr.detach(Le_t + Lr_dir_t)
+            Lt = (Lt + Lt_dir) if primal else (Lt - Lt_dir)
             ray = si.spawn_ray(si.to_world(bsdf_sample.wo))
             η *= bsdf_sample.eta
             β *= bsdf_weight / pdf_bsdf_method
 
             # Information about the current vertex needed by the next iteration
 
-            prev_si = dr.detach(si, True)
-            prev_bsdf_pdf = bsdf_sample.pdf
-            prev_bsdf_delta = mi.has_flag(
-                bsdf_sample.sampled_type, mi.BSDFFlags.Delta)
+            prev_si = mi.Interaction3f(dr.detach(si, True))
+            prev_bsdf_pdf = dr.select(
+                mi.has_flag(bsdf_sample.sampled_type, mi.BSDFFlags.Delta),
+                -1.0, bsdf_sample.pdf)
 
             # -------------------- Stopping criterion ---------------------
 
             # Don't run another iteration if the throughput has reached zero
+            # (or, optionally, fallen below a user-defined threshold)
             β_max = dr.max(β)
             active_next &= (β_max != 0)
+            if self.min_throughput > 0:
+                active_next &= β_max > self.min_throughput
 
             # Russian roulette stopping probability (must cancel out ior^2
             # to obtain unitless throughput, enforces a minimum probability)
-            rr_prob = dr.minimum(β_max * η**2, .95)
+            rr_prob = dr.minimum(β_max * η * η, .95)
             active_next &= rr_prob > 0
 
             # Apply only further along the path since, this introduces variance
-            rr_active = depth >= self.rr_depth
-            β[rr_active] *= dr.rcp(rr_prob) & (rr_prob > 0)
+            rr_active = depth >= self.rr_depth_opaque
+            β[rr_active] *= dr.select(rr_prob > 0, dr.rcp(rr_prob), 0.0)
             rr_continue = sampler.next_1d() < rr_prob
             active_next &= ~rr_active | rr_continue
 
@@ -578,7 +680,13 @@ class TransientNLOSPath(TransientADIntegrator):
 
                     # Propagate derivatives from/to 'Lo' based on 'mode'
                     if dr.hint(mode == dr.ADMode.Backward, mode='scalar'):
-                        dr.backward_from(δL * Lo)
+                        # Transient counterpart: the contributions of this
+                        # vertex and of the following ones ('Lt', which
+                        # already includes their adjoint). 'δL' is zero if
+                        # the steady image has no gradient, hence the check
+                        δLo = δL * Lo + Le_t + Lr_dir_t + Lt * tmp_replaced
+                        if dr.hint(dr.grad_enabled(δLo), mode='scalar'):
+                            dr.backward_from(δLo)
                     else:
                         δL += dr.forward_to(Lo)
 
@@ -589,7 +697,7 @@ class TransientNLOSPath(TransientADIntegrator):
             L if primal else δL,  # Radiance/differential radiance
             (depth != 0),         # Ray validity flag for alpha blending
             [],                   # Empty typle of AOVs
-            L                     # State for the differential phase
+            (L, Lt)               # State for the differential phase
         )
 
 
@@ -30,6 +30,20 @@ class TransientPath(TransientADIntegrator):
          this distance is taken into account, so you see the same thing that you 
          would see with a real-world ultra-fast camera. (default: false)
 
+     * - cache_primary_rays
+       - |bool|
+       - If True, the rays generated at the sensor are stored and reused in
+         subsequent renders with the same sensor, film size, seed and sample
+         count. Useful in optimization loops where the sensor does not change.
+         Do not enable it if the sensor parameters are modified. (default: false)
+
+     * - megakernel
+       - |bool|
+       - If True, the path tracing loop and its virtual function calls are
+         compiled into a single kernel (Dr.Jit symbolic mode). If False,
+         they are evaluated as a sequence of wavefront kernels, which can
+         help when debugging. (default: true)
+
      * - temporal_filter
        - |string|
        - Can be either:
@@ -71,12 +85,13 @@ class TransientPath(TransientADIntegrator):
                sampler: mi.Sampler,
                ray: mi.Ray3f,
                δL: Optional[mi.Spectrum],
-               state_in: Optional[mi.Spectrum],
+               state_in: Optional[Tuple[mi.Spectrum, mi.Spectrum]],
                active: mi.Bool,
                # add_transient accepts (spec, distance, wavelengths, active)
-               add_transient: Callable[[mi.Spectrum, mi.Float, mi.UnpolarizedSpectrum, mi.Mask], None],
+               # add_transient returns the spectrum weighted by its transient adjoint
+               add_transient: Callable[[mi.Spectrum, mi.Float, mi.UnpolarizedSpectrum, mi.Mask], mi.Spectrum],
                **kwargs  # Absorbs unused arguments
-               ) -> Tuple[mi.Spectrum, mi.Bool, List[mi.Float], mi.Spectrum]:
+               ) -> Tuple[mi.Spectrum, mi.Bool, List[mi.Float], Tuple[mi.Spectrum, mi.Spectrum]]:
         """
         See ``TransientADIntegrator.sample()`` for a description of this interface and
         the role of the various parameters and return values.
@@ -93,7 +108,9 @@ class TransientPath(TransientADIntegrator):
         # Copy input arguments to avoid mutating the caller's state
         ray = mi.Ray3f(dr.detach(ray))
         depth = mi.UInt32(0)                          # Depth of current vertex
-        L = mi.Spectrum(0 if primal else state_in)    # Radiance accumulator
+        L = mi.Spectrum(0 if primal else state_in[0])  # Radiance accumulator
+        # Radiance weighted by the adjoint of the transient image
+        Lt = mi.Spectrum(0 if primal else state_in[1])
         # Differential/adjoint radiance
         δL = mi.Spectrum(δL if δL is not None else 0)
         β = mi.Spectrum(1)                            # Path throughput weight
@@ -102,9 +119,11 @@ class TransientPath(TransientADIntegrator):
         distance = mi.Float(0.0)                      # Distance of the path
 
         # Variables caching information from the previous bounce
-        prev_si = dr.zeros(mi.SurfaceInteraction3f)
-        prev_bsdf_pdf = mi.Float(1.0)
-        prev_bsdf_delta = mi.Bool(True)
+        # (only the Interaction3f fields are needed for MIS, which keeps the
+        # loop state much smaller than a full SurfaceInteraction3f)
+        prev_si = dr.zeros(mi.Interaction3f)
+        # A negative pdf flags a delta BSDF sample (saves a loop variable)
+        prev_bsdf_pdf = mi.Float(-1.0)
 
         if self.camera_unwarp:
             si = scene.ray_intersect(mi.Ray3f(ray),
@@ -142,15 +161,16 @@ class TransientPath(TransientADIntegrator):
             ds = mi.DirectionSample3f(scene, si=si, ref=prev_si)
 
             mis = mis_weight(
-                prev_bsdf_pdf,
-                scene.pdf_emitter_direction(prev_si, ds, ~prev_bsdf_delta)
+                dr.abs(prev_bsdf_pdf),
+                scene.pdf_emitter_direction(prev_si, ds, prev_bsdf_pdf >= 0)
             )
 
             with dr.resume_grad(when=not primal):
                 Le = β * mis * ds.emitter.eval(si, active_next)
 
-            # Add transient contribution because of emitter found
-            add_transient(Le, distance, ray.wavelengths, active)
+            # Add transient contribution because of emitter found (only lanes
+            # where the emitter was evaluated can hold a nonzero value)
+            Le_t = add_transient(Le, distance, ray.wavelengths, active_next)
 
             # ---------------------- Emitter sampling ----------------------
 
@@ -185,8 +205,8 @@ class TransientPath(TransientADIntegrator):
                 Lr_dir = β * mis_em * bsdf_value_em * em_weight
 
             # Add contribution direct emitter sampling
-            add_transient(Lr_dir, distance + ds.dist *
-                          η, ray.wavelengths, active)
+            Lr_dir_t = add_transient(Lr_dir, distance + ds.dist *
+                                     η, ray.wavelengths, active_em)
 
             # ------------------ Detached BSDF sampling -------------------
 
@@ -198,16 +218,18 @@ class TransientPath(TransientADIntegrator):
             # ---- Update loop variables based on current interaction -----
 
             L = (L + Le + Lr_dir) if primal else (L - Le - Lr_dir)
+            Lt_dir = dr.detach(Le_t + Lr_dir_t)
+            Lt = (Lt + Lt_dir) if primal else (Lt - Lt_dir)
             ray = si.spawn_ray(si.to_world(bsdf_sample.wo))
             η *= bsdf_sample.eta
             β *= bsdf_weight
 
             # Information about the current vertex needed by the next iteration
 
-            prev_si = dr.detach(si, True)
-            prev_bsdf_pdf = bsdf_sample.pdf
-            prev_bsdf_delta = mi.has_flag(
-                bsdf_sample.sampled_type, mi.BSDFFlags.Delta)
+            prev_si = mi.Interaction3f(dr.detach(si, True))
+            prev_bsdf_pdf = dr.select(
+                mi.has_flag(bsdf_sample.sampled_type, mi.BSDFFlags.Delta),
+                -1.0, bsdf_sample.pdf)
 
             # -------------------- Stopping criterion ---------------------
 
@@ -217,12 +239,12 @@ class TransientPath(TransientADIntegrator):
 
             # Russian roulette stopping probability (must cancel out ior^2
             # to obtain unitless throughput, enforces a minimum probability)
-            rr_prob = dr.minimum(β_max * η**2, .95)
+            rr_prob = dr.minimum(β_max * η * η, .95)
             active_next &= rr_prob > 0
 
             # Apply only further along the path since, this introduces variance
             rr_active = depth >= self.rr_depth
-            β[rr_active] *= dr.rcp(rr_prob) & (rr_prob > 0)
+            β[rr_active] *= dr.select(rr_prob > 0, dr.rcp(rr_prob), 0.0)
             rr_continue = sampler.next_1d() < rr_prob
             active_next &= ~rr_active | rr_continue
 
@@ -276,7 +298,13 @@ class TransientPath(TransientADIntegrator):
 
                     # Propagate derivatives from/to 'Lo' based on 'mode'
                     if dr.hint(mode == dr.ADMode.Backward, mode='scalar'):
-                        dr.backward_from(δL * Lo)
+                        # Transient counterpart: the contributions of this
+                        # vertex and of the following ones ('Lt', which
+                        # already includes their adjoint). 'δL' is zero if
+                        # the steady image has no gradient, hence the check
+                        δLo = δL * Lo + Le_t + Lr_dir_t + Lt * tmp_replaced
+                        if dr.hint(dr.grad_enabled(δLo), mode='scalar'):
+                            dr.backward_from(δLo)
                     else:
                         δL += dr.forward_to(Lo)
 
@@ -287,7 +315,7 @@ class TransientPath(TransientADIntegrator):
             L if primal else δL,  # Radiance/differential radiance
             (depth != 0),         # Ray validity flag for alpha blending
             [],                   # Empty typle of AOVs
-            L                     # State for the differential phase
+            (L, Lt)               # State for the differential phase
         )
 
 
@@ -55,6 +55,9 @@ class TransientImageBlock(mi.Object):
         size_ext = self.size_xyt + 2 * border_size_ScalarPoint3
 
         size_flat = self.channel_count * dr.prod(size_ext)
+        # Layout is [y, x, t, channel]: the time bins of a pixel are contiguous.
+        # Samples of the same pixel are consecutive in the wavefront, so
+        # neighboring lanes scatter into nearby bins of the same pixel
         shape = (size_ext.y, size_ext.x, size_ext.z, self.channel_count)
 
         self.tensor = mi.TensorXf(dr.zeros(mi.Float, size_flat), shape)
@@ -67,25 +70,88 @@ class TransientImageBlock(mi.Object):
         self.size_xyt = size_xyt
 
     def accum(self, value: mi.Float, index: mi.UInt32, active: mi.Bool):
+        # Samples of the same pixel are consecutive in the wavefront and often
+        # land in the same bin: pre-reduce them within each warp/packet so that
+        # a single atomic is issued per distinct target
         dr.scatter_reduce(dr.ReduceOp.Add, self.tensor.array,
-                          value, index, active)
+                          value, index, active, mode=dr.ReduceMode.Local)
 
-    def put(self, pos: mi.Point3f, wavelengths: mi.UnpolarizedSpectrum,
-            value: mi.Spectrum, alpha: mi.Float,
-            weight: mi.Float, active: bool = True):
+    def values_(self, wavelengths: mi.UnpolarizedSpectrum, value: mi.Spectrum,
+                alpha: mi.Float, weight: mi.Float, active: bool = True):
         spec_u = mi.unpolarized_spectrum(value)
 
         if mi.is_spectral:
             rgb = mi.spectrum_to_srgb(spec_u, wavelengths, active)
-            values = [rgb.x, rgb.y, rgb.z, alpha, weight]
+            return [rgb.x, rgb.y, rgb.z, alpha, weight]
         elif mi.is_monochromatic:
-            values = [spec_u.x, alpha, weight]
+            return [spec_u.x, alpha, weight]
         else:
-            values = [spec_u.x, spec_u.y, spec_u.z, alpha, weight]
+            return [spec_u.x, spec_u.y, spec_u.z, alpha, weight]
+
+    def index_(self, pos: mi.Point2f, bin_idx: mi.UInt32, active: bool = True):
+        # Pixel position and time bin are kept as separate arrays
+        # (the time bin is already an integer index, no need to floor it)
+        offset_xy = mi.ScalarPoint2i(self.offset_xyt.x, self.offset_xyt.y)
+        size_xy = mi.ScalarVector2u(self.size_xyt.x, self.size_xyt.y)
+        p = mi.Point2u(dr.floor(pos) - offset_xy)
+
+        index = dr.fma(p.y, self.size_xyt.x, p.x)
+        index = dr.fma(index, self.size_xyt.z, bin_idx)
+
+        active &= dr.all((0 <= p) & (p < size_xy)) & (bin_idx < self.size_xyt.z)
+
+        return index, active
+
+    def put(self, pos: mi.Point2f, bin_idx: mi.UInt32, wavelengths: mi.UnpolarizedSpectrum,
+            value: mi.Spectrum, alpha: mi.Float,
+            weight: mi.Float, active: bool = True):
+        values = self.values_(wavelengths, value, alpha, weight, active)
+        self.put_(pos, bin_idx, values, active)
+
+    def put_adjoint(self, pos: mi.Point2f, bin_idx: mi.UInt32, wavelengths: mi.UnpolarizedSpectrum,
+                    value: mi.Spectrum, grad: mi.TensorXf, active: bool = True) -> mi.UnpolarizedSpectrum:
+        """
+        Reverse-mode counterpart of ``put()``. Instead of accumulating ``value``,
+        gathers its adjoint from ``grad`` (a tensor with the same layout as
+        this block, possibly without the trailing alpha/weight channels).
+
+        Returns the value weighted by its adjoint, per spectral channel
+        (zero for samples that fall outside of the block). It is still
+        attached to the AD graph of ``value``: back-propagating from it
+        (e.g. ``dr.backward_from()``) yields the derivatives of ``value``.
+        """
+        if self.rfilter:
+            mi.Log(mi.LogLevel.Error, "TransientImageBlock::put_adjoint(): using a rfilter but it is not supported. If you need this, please open an issue on GitHub.")
 
-        self.put_(pos, values, active)
+        index, active = self.index_(pos, bin_idx, active)
 
-    def put_(self, pos: mi.Point3f, values: Sequence[mi.Float], active: bool = True):
+        grad_channels = grad.shape[-1]
+        index *= grad_channels
+
+        color_channels = 1 if mi.is_monochromatic else 3
+        δchannels = [dr.gather(mi.Float, grad.array, index + k, active)
+                     for k in range(color_channels)]
+
+        return self.adjoint_(wavelengths, δchannels, active) * mi.unpolarized_spectrum(value)
+
+    def adjoint_(self, wavelengths: mi.UnpolarizedSpectrum, δchannels: Sequence[mi.Float],
+                 active: bool = True) -> mi.UnpolarizedSpectrum:
+        # Adjoint of the spectrum of a sample, given the adjoint of the color
+        # channels computed by values_() (which are linear in the spectrum)
+        if mi.is_spectral:
+            with dr.resume_grad():
+                spec_u = dr.zeros(mi.UnpolarizedSpectrum, dr.width(wavelengths))
+                dr.enable_grad(spec_u)
+                rgb = mi.spectrum_to_srgb(spec_u, wavelengths, active)
+                dr.backward_from(δchannels[0] * rgb.x + δchannels[1] * rgb.y +
+                                 δchannels[2] * rgb.z)
+                return dr.grad(spec_u)
+        elif mi.is_monochromatic:
+            return mi.UnpolarizedSpectrum(δchannels[0])
+        else:
+            return mi.UnpolarizedSpectrum(δchannels[0], δchannels[1], δchannels[2])
+
+    def put_(self, pos: mi.Point2f, bin_idx: mi.UInt32, values: Sequence[mi.Float], active: bool = True):
         # Check if all sample values are valid
         if self.warn_negative or self.warn_invalid:
             is_valid = True
@@ -111,14 +177,15 @@ class TransientImageBlock(mi.Object):
         # Fast special case for the box filter
         # ====================================
         if not self.rfilter:
-            p = mi.Point3u(dr.floor(pos) - self.offset_xyt)
-
-            index = dr.fma(p.y, self.size_xyt.x, p.x)
-            index = dr.fma(index, self.size_xyt.z, p.z) * self.channel_count
-
-            active &= dr.all((0 <= p) & (p < self.size_xyt))
+            index, active = self.index_(pos, bin_idx, active)
+            index *= self.channel_count
 
             for k in range(self.channel_count):
+                # Channels that are a constant zero (e.g. alpha/weight of
+                # transient samples) leave the block unchanged: skip their
+                # scatter so that only informative atomics are issued
+                if isinstance(values[k], (int, float)) and values[k] == 0:
+                    continue
                 self.accum(values[k], index + k, active)
         else:
             mi.Log(mi.LogLevel.Error, "TransientImageBlock::put_(): using a rfilter but it is not supported. If you need this, please open an issue on GitHub.")
@@ -0,0 +1,139 @@
+def cornell_box(cache_primary_rays=False):
+    import mitsuba as mi
+    scene = mi.cornell_box()
+    scene['integrator'] = {
+        'type': 'transient_path',
+        'max_depth': 4,
+        'cache_primary_rays': cache_primary_rays,
+    }
+    scene['sensor']['film'] = {
+        'type': 'transient_hdr_film',
+        'width': 8,
+        'height': 8,
+        'temporal_bins': 40,
+        'bin_width_opl': 0.25,
+        'start_opl': 3.0,
+        'rfilter': {
+            'type': 'box',
+        },
+    }
+    return scene
+
+
+def test00_primary_rays_cache_optimization_loop():
+    import drjit as dr
+    import mitsuba as mi
+    mi.set_variant('llvm_ad_rgb')
+    import mitransient as mitr
+    scene = mi.load_dict(cornell_box(cache_primary_rays=True))
+    integrator = scene.integrator()
+    params = mi.traverse(scene)
+    key = 'green.reflectance.value'
+    dr.enable_grad(params[key])
+    params.update()
+
+    # Count the rays that are actually generated
+    calls = []
+    sample_rays = integrator.sample_rays
+
+    def sample_rays_counted(*args, **kwargs):
+        calls.append(args)
+        return sample_rays(*args, **kwargs)
+
+    integrator.sample_rays = sample_rays_counted
+    try:
+        # mi.render() uses a different seed for the primal and the gradient
+        # pass: both sets of rays must be reused across iterations
+        for _ in range(4):
+            data_steady, data_transient = mi.render(
+                scene, params, seed=0, spp=4)
+            dr.backward(dr.sum(data_transient, axis=None))
+        assert len(calls) == 2
+    finally:
+        del integrator.sample_rays
+
+    # Cache hits must render the same images as the uncached integrator
+    scene_ref = mi.load_dict(cornell_box())
+    data_steady_ref, data_transient_ref = scene_ref.integrator().render(
+        scene_ref, seed=0, spp=4)
+    data_steady, data_transient = integrator.render(scene, seed=0, spp=4)
+    assert dr.allclose(data_steady, data_steady_ref)
+    assert dr.allclose(data_transient, data_transient_ref)
+
+
+def test01_pass_seeds_cache():
+    import mitsuba as mi
+    mi.set_variant('llvm_ad_rgb')
+    import mitransient as mitr
+    scene = mi.load_dict(cornell_box())
+    integrator = scene.integrator()
+    sensor = scene.sensors()[0]
+
+    # Enough samples to split the render into several passes
+    spp = 2**26 + 1
+
+    def pass_seeds(seed):
+        samplers_spps = integrator.prepare(scene, sensor, seed, spp, [])
+        assert len(samplers_spps) > 1
+        return integrator.pass_seeds_cache[(id(sensor.sampler()), seed,
+                                            len(samplers_spps))]
+
+    # The seeds of both passes of mi.render() are reused
+    seed_grad = mi.sample_tea_32(0, 1)[0]
+    seeds, seeds_grad = pass_seeds(0), pass_seeds(seed_grad)
+    for _ in range(3):
+        assert pass_seeds(0) is seeds
+        assert pass_seeds(seed_grad) is seeds_grad
+
+    # A new seed every iteration does not grow the cache
+    for seed in range(1, 10):
+        pass_seeds(seed)
+    assert len(integrator.pass_seeds_cache) == 2
+
+
+def test02_film_reuse():
+    import drjit as dr
+    import mitsuba as mi
+    mi.set_variant('llvm_ad_rgb')
+    import mitransient as mitr
+
+    def render(scene):
+        return scene.integrator().render(scene, seed=0, spp=4)
+
+    def render_fresh(**film_props):
+        scene_dict = cornell_box()
+        scene_dict['sensor']['film'].update(film_props)
+        return render(mi.load_dict(scene_dict))
+
+    def assert_equal(data, data_ref):
+        for image, image_ref in zip(data, data_ref):
+            assert image.shape == image_ref.shape
+            assert dr.allclose(image, image_ref)
+
+    scene = mi.load_dict(cornell_box())
+    params = mi.traverse(scene)
+
+    # The second render reuses the film: it must not accumulate the samples
+    # of the first one
+    render(scene)
+    assert_equal(render(scene), render_fresh())
+
+    # Changing the crop window or the number of bins rebuilds the film
+    params['sensor.film.crop_offset'] = mi.ScalarPoint2u(2, 2)
+    params['sensor.film.crop_size'] = mi.ScalarVector2u(4, 4)
+    params.update()
+    data = render(scene)
+    assert data[0].shape[:2] == (4, 4)
+    assert_equal(data, render_fresh(crop_offset_x=2, crop_offset_y=2,
+                                     crop_width=4, crop_height=4))
+
+    params['sensor.film.crop_offset'] = mi.ScalarPoint2u(0, 0)
+    params['sensor.film.crop_size'] = mi.ScalarVector2u(8, 8)
+    params.update()
+    assert_equal(render(scene), render_fresh())
+
+    # Not a Mitsuba type, so it cannot be modified with mi.traverse()
+    scene.sensors()[0].film().temporal_bins = 20
+    data = render(scene)
+    assert data[1].shape[2] == 20
+    assert_equal(data, render_fresh(temporal_bins=20))
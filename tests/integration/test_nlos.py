@@ -10,11 +10,11 @@ def integrator():
     }
 
 
-def Z():
+def Z(filename):
     from mitsuba import ScalarTransform4f as T
     return {
         'type': 'obj',
-        'filename': 'examples/transient-nlos/Z.obj',
+        'filename': filename,
         'bsdf': {
             'type': 'diffuse',
             'reflectance': {
@@ -22,7 +22,7 @@ def Z():
                 'value': [1.0, 1.0, 1.0],
             },
         },
-        'to_world': T.translate([0.0, 0.0, 1.0]),
+        'to_world': T().translate([0.0, 0.0, 1.0]),
     }
 
 
@@ -30,7 +30,7 @@ def laser():
     from mitsuba import ScalarTransform4f as T
     return {
         'type': 'projector',
-        'to_world': T.translate([-0.5, 0.0, 0.25]),
+        'to_world': T().translate([-0.5, 0.0, 0.25]),
         'irradiance': {
             'type': 'rgb',
             'value': [1.0, 1.0, 1.0],
@@ -78,7 +78,19 @@ def relay_wall(sensor):
     }
 
 
-def test00_Z_single():
+def Z_obj(tmp_path):
+    # Letter Z of side 1 facing the relay wall (-z), made of three quads
+    # (the examples folder with Z.obj is not shipped with the package)
+    filename = tmp_path / 'Z.obj'
+    filename.write_text(
+        'v -0.5 0.5 0\nv 0.5 0.5 0\nv 0.5 0.3 0\nv -0.5 0.3 0\n'
+        'v 0.3 0.3 0\nv 0.5 0.3 0\nv -0.3 -0.3 0\nv -0.5 -0.3 0\n'
+        'v -0.5 -0.3 0\nv 0.5 -0.3 0\nv 0.5 -0.5 0\nv -0.5 -0.5 0\n'
+        'f 1 2 3\nf 1 3 4\nf 5 6 7\nf 5 7 8\nf 9 10 11\nf 9 11 12\n')
+    return str(filename)
+
+
+def test00_Z_single(tmp_path):
     import drjit as dr
     import mitsuba as mi
     mi.set_variant('llvm_ad_rgb')
@@ -91,7 +103,7 @@ def test00_Z_single():
         {
             'type': 'scene',
             'integrator': integrator(),
-            'Z': Z(),
+            'Z': Z(Z_obj(tmp_path)),
             'laser': laser_obj,
             'relay_wall': relay_wall_obj,
         }
@@ -103,16 +115,79 @@ def test00_Z_single():
         laser_obj)
 
     transient_integrator = scene.integrator()
-    transient_integrator.prepare_transient(scene, sensor=0)
 
     # Render the scene and develop the data
     data_steady, data_transient = transient_integrator.render(scene)
     # And evaluate the output to launch the corresponding kernel
     dr.eval(data_steady, data_transient)
 
-    # FIXME the data is transposed when comparing steady and transient
-    # TAL expects (sx, sy) format for data_transient, does not care about
-    # data_steady
-    # maybe this is just not a problem
+    # Both images are stored in (sy, sx) order
+    # (NOTE: TAL expects (sx, sy) format for data_transient)
     assert data_steady.shape == (sy, sx, 3)
-    assert data_transient.shape == (sx, sy, 300, 3)
+    assert data_transient.shape == (sy, sx, 300, 3)
+
+
+def hidden_plane():
+    from mitsuba import ScalarTransform4f as T
+    return {
+        'type': 'rectangle',
+        'bsdf': {
+            'type': 'diffuse',
+            'reflectance': {
+                'type': 'rgb',
+                'value': [1.0, 1.0, 1.0],
+            },
+        },
+        'to_world': T().translate([0.0, 0.0, 1.0]).rotate([1.0, 0.0, 0.0], 180.0),
+    }
+
+
+def test01_kernel_cache_reuse():
+    import drjit as dr
+    import mitsuba as mi
+    mi.set_variant('llvm_ad_rgb')
+    import mitransient as mitr
+    sx, sy = 4, 2
+    relay_wall_obj = mi.load_dict(relay_wall(
+        lambda: sensor('single', sx=sx, sy=sy, spp=1)))
+    laser_obj = mi.load_dict(laser())
+    scene = mi.load_dict(
+        {
+            'type': 'scene',
+            'integrator': integrator(),
+            'hidden': hidden_plane(),
+            'laser': laser_obj,
+            'relay_wall': relay_wall_obj,
+        }
+    )
+
+    mitr.nlos.focus_emitter_at_relay_wall_pixel(
+        mi.Point2f(sx / 2, sy / 2),
+        relay_wall_obj,
+        laser_obj)
+
+    transient_integrator = scene.integrator()
+
+    # The first renders compile the kernels (the second one also compiles
+    # the path that reuses the film and the caches set up by the first one)
+    for _ in range(2):
+        dr.eval(transient_integrator.render(scene, seed=0))
+
+    # Changing the depth parameters must not compile new kernels
+    # (i.e. they must not be baked in the kernel as literals)
+    transient_integrator.max_depth = 6
+    transient_integrator.rr_depth = 3
+
+    dr.set_flag(dr.JitFlag.KernelHistory, True)
+    try:
+        dr.kernel_history()
+        dr.eval(transient_integrator.render(scene, seed=0))
+        history = dr.kernel_history([dr.KernelType.JIT])
+    finally:
+        dr.set_flag(dr.JitFlag.KernelHistory, False)
+
+    # Hits must come from the in-memory cache: a hit on the on-disk cache
+    # means that a kernel was compiled for the new configuration before
+    assert len(history) > 0
+    assert all(kernel['cache_hit'] and not kernel['cache_disk']
+               for kernel in history)
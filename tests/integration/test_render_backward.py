@@ -0,0 +1,94 @@
+import pytest
+
+
+def cornell_box(integrator_type):
+    import mitsuba as mi
+    scene = mi.cornell_box()
+    scene['integrator'] = {
+        'type': integrator_type,
+        'max_depth': 4,
+        'rr_depth': 100,
+    }
+    scene['sensor']['film'] = {
+        'type': 'transient_hdr_film',
+        'width': 6,
+        'height': 6,
+        'temporal_bins': 40,
+        'bin_width_opl': 0.25,
+        'start_opl': 3.0,
+        'rfilter': {
+            'type': 'box',
+        },
+    }
+    scene['sensor']['sampler'] = {
+        'type': 'independent',
+        'sample_count': 16,
+    }
+    return scene
+
+
+def render_backward_vs_finite_differences(integrator_type, steady, transient):
+    import drjit as dr
+    import mitsuba as mi
+    import numpy as np
+    scene = mi.load_dict(cornell_box(integrator_type))
+    integrator = scene.integrator()
+    params = mi.traverse(scene)
+    key = 'green.reflectance.value'
+    base = mi.Color3f(params[key])
+
+    # Linear loss with random weights for each pixel (and time bin)
+    data_steady, data_transient = integrator.render(scene, seed=0, spp=16)
+    rng = np.random.default_rng(1)
+
+    def weights(shape, enabled):
+        if not enabled:
+            return dr.zeros(mi.TensorXf, shape)
+        return mi.TensorXf(rng.random(shape).astype(np.float32))
+
+    w_steady = weights(data_steady.shape, steady)
+    w_transient = weights(data_transient.shape, transient)
+
+    def loss(scale):
+        params[key] = base * scale
+        params.update()
+        data_steady, data_transient = integrator.render(scene, seed=0, spp=16)
+        return (dr.sum(data_steady * w_steady, axis=None) +
+                dr.sum(data_transient * w_transient, axis=None)).array[0]
+
+    # Derivative of the loss w.r.t. the scale of the reflectance. The same
+    # seed is used for both passes so that the samples match the primal ones
+    params[key] = mi.Color3f(base)
+    dr.enable_grad(params[key])
+    params.update()
+    integrator.render_backward(scene, params, (w_steady, w_transient),
+                               seed=0, spp=16)
+    grad = dr.sum(dr.grad(params[key]) * base)[0]
+    dr.disable_grad(params[key])
+
+    h = 1e-2
+    grad_fd = (loss(1 + h) - loss(1 - h)) / (2 * h)
+    assert grad_fd != 0
+    assert abs(grad - grad_fd) < 5e-3 * abs(grad_fd)
+
+
+@pytest.mark.parametrize('integrator_type', [
+    'transient_path', 'transient_nlos_path', 'transient_prbvolpath'])
+def test00_render_backward_transient(integrator_type):
+    import mitsuba as mi
+    mi.set_variant('llvm_ad_rgb')
+    import mitransient as mitr
+    # Only the transient image contributes to the loss: the gradients of
+    # the BSDFs must reach every vertex of the path
+    render_backward_vs_finite_differences(
+        integrator_type, steady=False, transient=True)
+
+
+@pytest.mark.parametrize('integrator_type', [
+    'transient_path', 'transient_nlos_path', 'transient_prbvolpath'])
+def test01_render_backward_steady_and_transient(integrator_type):
+    import mitsuba as mi
+    mi.set_variant('llvm_ad_rgb')
+    import mitransient as mitr
+    render_backward_vs_finite_differences(
+        integrator_type, steady=True, transient=True)